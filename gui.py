@@ -7,9 +7,9 @@ Interface gráfica para monitorar e controlar o servidor SSE
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
-import asyncio
+import queue
 import json
-import requests
+from collections import Counter, deque
 from datetime import datetime
 from pathlib import Path
 import sys
@@ -17,12 +17,24 @@ import os
 
 # Importa o servidor
 try:
-    from server import app, start_monitoring, stop_monitoring, DEFAULT_JOURNAL_PATH
+    from server import app, broadcaster, stop_monitoring, DEFAULT_JOURNAL_PATH
     import uvicorn
 except ImportError:
     messagebox.showerror("Erro", "Não foi possível importar o módulo server.py")
     sys.exit(1)
 
+# Intervalo entre atualizações da interface (ms)
+UI_REFRESH_MS = 100
+# Máximo de eventos processados por atualização
+UI_BATCH_SIZE = 500
+# Eventos exibidos por atualização (os demais só entram nas estatísticas)
+UI_RENDER_LIMIT = 50
+# Eventos mantidos em memória e linhas mantidas na aba de eventos
+MAX_EVENT_HISTORY = 1000
+MAX_EVENT_LINES = 5000
+# Eventos aguardando a interface antes de descartar
+MAX_PENDING_EVENTS = 10000
+
 
 class EliteSSEGUI:
     def __init__(self, root):
@@ -35,10 +47,15 @@ class EliteSSEGUI:
         self.server_running = False
         self.server_thread = None
         self.uvicorn_server = None
-        self.event_source = None
         self.journal_path = DEFAULT_JOURNAL_PATH
         self.event_count = 0
-        self.events_list = []
+        self.dropped_count = 0
+        # Eventos chegam pelo loop do servidor e são consumidos pelo Tk via after()
+        self.pending_events = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+        self.events_list = deque(maxlen=MAX_EVENT_HISTORY)
+        self.event_types = Counter()
+        # id do after() de drain_events; None quando não há ciclo ativo
+        self.drain_job = None
 
         # Configurações
         self.host = "0.0.0.0"
@@ -55,9 +72,16 @@ class EliteSSEGUI:
     def log(self, message, level="INFO"):
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_message = f"[{timestamp}] [{level}] {message}\n"
+        print(log_message.strip())
+        # Widgets Tk só podem ser alterados pela thread principal
+        if threading.current_thread() is threading.main_thread():
+            self.append_log(log_message)
+        else:
+            self.root.after(0, self.append_log, log_message)
+
+    def append_log(self, log_message):
         self.logs_text.insert(tk.END, log_message)
         self.logs_text.see(tk.END)
-        print(log_message.strip())
 
     def update_status(self, text, color):
         self.status_label.config(text=f"Status: {text}", fg=color)
@@ -85,32 +109,44 @@ class EliteSSEGUI:
             return
         self.log("Iniciando servidor SSE...")
         self.update_status("Iniciando...", "yellow")
-        if start_monitoring(self.journal_path):
-            self.server_thread = threading.Thread(
-                target=self.run_server,
-                daemon=True
-            )
-            self.server_thread.start()
-            self.server_running = True
-            self.start_button.config(state='disabled')
-            self.stop_button.config(state='normal')
-            self.browse_button.config(state='disabled')
-            self.update_status("Rodando", "green")
-            self.log("Servidor iniciado com sucesso!")
-            self.log(f"Acesse: http://localhost:{self.port}")
-            self.start_event_monitoring()
-        else:
-            self.log("Erro ao iniciar monitoramento", "ERROR")
-            self.update_status("Erro", "red")
-            messagebox.showerror("Erro", "Não foi possível iniciar o monitoramento")
+        # O monitoramento é iniciado pelo próprio servidor, dentro do seu loop
+        os.environ["ELITE_JOURNAL_PATH"] = str(self.journal_path)
+        self.server_running = True
+        self.start_event_monitoring()
+        self.server_thread = threading.Thread(
+            target=self.run_server,
+            daemon=True
+        )
+        self.server_thread.start()
+        self.start_button.config(state='disabled')
+        self.stop_button.config(state='normal')
+        self.browse_button.config(state='disabled')
+        # "Rodando" só depois que o uvicorn abrir a porta
+        self.root.after(UI_REFRESH_MS, self.check_server_started)
 
     def run_server(self):
         try:
             config = uvicorn.Config(app, host=self.host, port=self.port, log_level="info")
             self.uvicorn_server = uvicorn.Server(config)
             self.uvicorn_server.run()
-        except Exception as e:
-            self.log(f"Erro no servidor: {e}", "ERROR")
+        except BaseException as e:
+            # Falha ao abrir a porta encerra o uvicorn com SystemExit
+            self.log(f"Erro no servidor: {e!r}", "ERROR")
+
+    def check_server_started(self):
+        """Acompanha a inicialização do uvicorn sem bloquear a interface"""
+        if not self.server_running:
+            return
+        if self.uvicorn_server is not None and self.uvicorn_server.started:
+            self.update_status("Rodando", "green")
+            self.log("Servidor iniciado com sucesso!")
+            self.log(f"Acesse: http://localhost:{self.port}")
+        elif self.server_thread.is_alive():
+            self.root.after(UI_REFRESH_MS, self.check_server_started)
+        else:
+            self.log(f"Não foi possível iniciar o servidor na porta {self.port}", "ERROR")
+            self.uvicorn_server = None
+            self.reset_server_state("Erro")
 
     def stop_server(self):
         if not self.server_running:
@@ -121,62 +157,80 @@ class EliteSSEGUI:
             self.uvicorn_server.should_exit = True
             self.server_thread.join(timeout=5)
             self.uvicorn_server = None
+        self.reset_server_state("Parado")
+        self.log("Servidor parado")
+        # Agora o processo Uvicorn é finalizado sem interação manual
+
+    def reset_server_state(self, status):
         stop_monitoring()
         self.server_running = False
+        broadcaster.remove_listener(self.on_server_event)
         self.start_button.config(state='normal')
         self.stop_button.config(state='disabled')
         self.browse_button.config(state='normal')
-        self.update_status("Parado", "red")
-        self.log("Servidor parado")
-        # Agora o processo Uvicorn é finalizado sem interação manual
+        self.update_status(status, "red")
 
     def start_event_monitoring(self):
-        thread = threading.Thread(target=self.monitor_events, daemon=True)
-        thread.start()
-
-    def monitor_events(self):
-        import sseclient
-        import requests
-        import time
-        time.sleep(2)
+        """Assina os eventos do servidor em processo, sem conexão HTTP"""
+        broadcaster.add_listener(self.on_server_event)
+        # Um Parar→Iniciar rápido reaproveita o ciclo que ainda esvazia a fila
+        if self.drain_job is None:
+            self.drain_job = self.root.after(UI_REFRESH_MS, self.drain_events)
+
+    def on_server_event(self, event_id, data):
+        """Chamado no loop do servidor: apenas enfileira para a thread do Tk"""
         try:
-            url = f"http://localhost:{self.port}/events"
-            response = requests.get(url, stream=True, timeout=None)
-            client = sseclient.SSEClient(response)
-            for event in client.events():
-                if not self.server_running:
-                    break
-                try:
-                    data = json.loads(event.data)
-                    self.process_event(event.event, data)
-                except json.JSONDecodeError:
-                    pass
-                except Exception as e:
-                    self.log(f"Erro ao processar evento: {e}", "ERROR")
-        except Exception as e:
-            self.log(f"Erro na conexão SSE: {e}", "ERROR")
-
-    def process_event(self, event_type, data):
-        self.event_count += 1
-        self.events_list.append({"type": event_type, "data": data})
-        self.events_count_label.config(text=f"📡 Eventos recebidos: {self.event_count}")
+            self.pending_events.put_nowait(data)
+        except queue.Full:
+            self.dropped_count += 1
+
+    def drain_events(self):
+        """Processa em lote os eventos pendentes e atualiza a interface uma vez"""
+        batch = []
+        try:
+            while len(batch) < UI_BATCH_SIZE:
+                batch.append(self.pending_events.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            try:
+                self.process_events(batch)
+            except Exception as e:
+                self.log(f"Erro ao processar evento: {e}", "ERROR")
+        if self.server_running or not self.pending_events.empty():
+            # Com fila cheia, volta logo; senão espera o próximo intervalo
+            self.drain_job = self.root.after(1 if len(batch) == UI_BATCH_SIZE else UI_REFRESH_MS, self.drain_events)
+        else:
+            self.drain_job = None
+
+    def process_events(self, batch):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        event_text = f"[{timestamp}] {event_type}\n{json.dumps(data, indent=2)}\n{'='*60}\n"
+        for data in batch:
+            event_type = data.get("event", "unknown")
+            self.event_count += 1
+            self.event_types[event_type] += 1
+            self.events_list.append({"type": event_type, "data": data})
+        self.events_count_label.config(text=f"📡 Eventos recebidos: {self.event_count}")
+
+        # Em rajadas, só os últimos eventos do lote são exibidos
+        event_text = "".join(
+            f"[{timestamp}] {data.get('event', 'unknown')}\n{json.dumps(data, indent=2)}\n{'='*60}\n"
+            for data in batch[-UI_RENDER_LIMIT:]
+        )
         self.events_text.insert(tk.END, event_text)
+        excess_lines = int(self.events_text.index("end-1c").split(".")[0]) - MAX_EVENT_LINES
+        if excess_lines > 0:
+            self.events_text.delete(1.0, f"{excess_lines + 1}.0")
         self.events_text.see(tk.END)
         self.update_stats()
-        if self.event_count % 50 == 0:
-            self.events_text.delete(1.0, "10.0")
 
     def update_stats(self):
-        event_types = {}
-        for event in self.events_list:
-            event_type = event["type"]
-            event_types[event_type] = event_types.get(event_type, 0) + 1
-        stats = f"Total de eventos: {self.event_count}\n\n"
-        stats += "Eventos por tipo:\n"
+        stats = f"Total de eventos: {self.event_count}\n"
+        if self.dropped_count:
+            stats += f"Descartados (interface atrasada): {self.dropped_count}\n"
+        stats += "\nEventos por tipo:\n"
         stats += "=" * 40 + "\n"
-        for event_type, count in sorted(event_types.items(), key=lambda x: x[1], reverse=True):
+        for event_type, count in self.event_types.most_common():
             stats += f"{event_type}: {count}\n"
         self.stats_text.delete(1.0, tk.END)
         self.stats_text.insert(1.0, stats)
@@ -0,0 +1,287 @@
+"""
+Elite Dangerous SSE - Pipeline de processamento de eventos
+Etapas registradas rodam em ordem sobre cada evento antes da publicação;
+etapas pesadas podem rodar em um pool de threads ou processos sem
+bloquear a leitura dos journals
+"""
+
+import math
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Callable, Dict, Any, List, Tuple
+
+# Workers dos pools usados pelas etapas pesadas
+PIPELINE_WORKERS = 2
+# Eventos em processamento antes de descartar os novos
+MAX_IN_FLIGHT = 1000
+# Espera máxima pelos eventos em processamento ao encerrar (segundos)
+DRAIN_TIMEOUT = 10.0
+
+# Campos removidos dos eventos pelo esquema de journal do EDDN
+EDDN_REMOVED_FIELDS = {
+    "ActiveFine", "BoostUsed", "CockpitBreach", "FuelLevel", "FuelUsed",
+    "JumpDist", "Latitude", "Longitude", "Wanted",
+}
+EDDN_REMOVED_FACTION_FIELDS = {
+    "HappiestSystem", "HomeSystem", "MyReputation", "SquadronFaction",
+}
+
+StageFunc = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+class PipelineStage:
+    """Uma etapa do pipeline e o tempo gasto nela"""
+
+    def __init__(self, name: str, func: StageFunc, pool: Optional[str] = None, fail_closed: bool = False):
+        if pool not in (None, "thread", "process"):
+            raise ValueError(f"Pool inválido para a etapa {name}: {pool}")
+        self.name = name
+        self.func = func
+        self.pool = pool
+        # Se a etapa falhar, descarta o evento em vez de publicá-lo sem ela
+        self.fail_closed = fail_closed
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def fail(self, event_data: Dict[str, Any], error: Exception) -> Optional[Dict[str, Any]]:
+        self.errors += 1
+        if self.fail_closed:
+            print(f"❌ Erro na etapa {self.name}, evento descartado: {error}")
+            return None
+        print(f"❌ Erro na etapa {self.name}: {error}")
+        return event_data
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pool": self.pool or "inline",
+            "fail_closed": self.fail_closed,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_time / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+        }
+
+
+class EventPipeline:
+    """Executa as etapas registradas e publica os eventos na ordem de chegada
+
+    Sem etapas em pool, o evento é processado e publicado na hora. Com etapas
+    em pool, cada evento vira uma task e uma única task publicadora aguarda as
+    tasks em ordem FIFO, então vários eventos são processados em paralelo sem
+    trocar a ordem de publicação. Acima de max_in_flight eventos pendentes,
+    os novos são descartados e contados em dropped.
+
+    O callback done de cada evento é chamado, também em ordem, quando ele
+    sai do pipeline (publicado ou descartado por uma etapa); a ingestão o usa
+    para saber até onde os journals já foram entregues.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[Dict[str, Any], float], None],
+        workers: int = PIPELINE_WORKERS,
+        max_in_flight: int = MAX_IN_FLIGHT,
+    ):
+        self.publish = publish
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.stages: List[PipelineStage] = []
+        # Callbacks chamados com o evento bruto, antes das etapas
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.executors: Dict[str, Executor] = {}
+        # (task, instante da ingestão em time.monotonic(), done)
+        self.in_flight: deque = deque()
+        self.dropped = 0
+        self.wakeup: Optional[asyncio.Event] = None
+        self.publisher: Optional[asyncio.Task] = None
+
+    def register(self, name: str, func: StageFunc, pool: Optional[str] = None, fail_closed: bool = False):
+        """Adiciona uma etapa ao final do pipeline
+
+        A função recebe o evento e retorna o evento (modificado ou não) ou None
+        para descartá-lo. Com pool="process" ela e o evento precisam ser
+        serializáveis com pickle. Se ela levantar uma exceção, o evento segue
+        sem a etapa, ou é descartado com fail_closed=True (ex.: remoção de
+        dados pessoais).
+        """
+        self.stages.append(PipelineStage(name, func, pool, fail_closed))
+
+    def stage(self, name: Optional[str] = None, pool: Optional[str] = None, fail_closed: bool = False):
+        """Decorador equivalente a register()"""
+        def decorator(func: StageFunc) -> StageFunc:
+            self.register(name or func.__name__, func, pool, fail_closed)
+            return func
+        return decorator
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Registra um callback para o evento bruto; não deve bloquear nem modificá-lo"""
+        self.listeners.append(listener)
+
+    @property
+    def pooled(self) -> bool:
+        return any(stage.pool for stage in self.stages)
+
+    def start(self):
+        """Inicia a task publicadora no loop em execução"""
+        self.wakeup = asyncio.Event()
+        self.publisher = asyncio.get_running_loop().create_task(self._publish_in_order())
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT):
+        """Publica os eventos em processamento e encerra os pools
+
+        Eventos descartados aqui não chamam done, então o snapshot de
+        encerramento não avança a posição de leitura além deles.
+        """
+        # Deixa rodar os submit() já agendados pelas threads de leitura
+        await asyncio.sleep(0)
+        if self.in_flight:
+            await asyncio.wait([task for task, _, _ in self.in_flight], timeout=timeout)
+        if self.publisher:
+            self.publisher.cancel()
+            await asyncio.gather(self.publisher, return_exceptions=True)
+            self.publisher = None
+        while self.in_flight and self.in_flight[0][0].done():
+            task, ingested_at, done = self.in_flight.popleft()
+            if not task.cancelled() and task.exception() is None:
+                self._finish(task.result(), ingested_at, done)
+        if self.in_flight:
+            print(f"⚠️  {len(self.in_flight)} evento(s) do pipeline descartados no encerramento")
+        for task, _, _ in self.in_flight:
+            task.cancel()
+        self.in_flight.clear()
+        # Só acontece no encerramento; esperar evita workers órfãos do pool de processos
+        for executor in self.executors.values():
+            executor.shutdown(wait=True)
+        self.executors.clear()
+
+    def submit(
+        self,
+        event_data: Dict[str, Any],
+        ingested_at: Optional[float] = None,
+        done: Optional[Callable[[], None]] = None,
+    ):
+        """Recebe um evento da ingestão; deve ser chamado no loop principal
+
+        ingested_at é o instante da leitura (time.monotonic()); sem ele, vale
+        o momento da chamada. done é chamado quando o evento sai do pipeline.
+        """
+        if ingested_at is None:
+            ingested_at = time.monotonic()
+        for listener in self.listeners:
+            listener(event_data)
+        if not self.pooled:
+            self._finish(self._run_inline(event_data, self.stages), ingested_at, done)
+            return
+        if self.publisher is None:
+            self.start()
+        if len(self.in_flight) >= self.max_in_flight:
+            # Sem done: eventos anteriores ainda podem estar em processamento
+            self.dropped += 1
+            return
+        self.in_flight.append((asyncio.get_running_loop().create_task(self._process(event_data)), ingested_at, done))
+        self.wakeup.set()
+
+    def _run_inline(self, event_data: Optional[Dict[str, Any]], stages: List[PipelineStage]) -> Optional[Dict[str, Any]]:
+        for stage in stages:
+            if event_data is None:
+                break
+            started = time.perf_counter()
+            try:
+                event_data = stage.func(event_data)
+            except Exception as e:
+                event_data = stage.fail(event_data, e)
+            stage.record(time.perf_counter() - started)
+        return event_data
+
+    def _executor(self, pool: str) -> Executor:
+        if pool not in self.executors:
+            executor_class = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+            self.executors[pool] = executor_class(max_workers=self.workers)
+        return self.executors[pool]
+
+    async def _process(self, event_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        for stage in self.stages:
+            if event_data is None:
+                break
+            if stage.pool is None:
+                event_data = self._run_inline(event_data, [stage])
+                continue
+            # Tempo de parede, incluindo a espera por um worker livre
+            started = time.perf_counter()
+            try:
+                event_data = await loop.run_in_executor(self._executor(stage.pool), stage.func, event_data)
+            except Exception as e:
+                event_data = stage.fail(event_data, e)
+            stage.record(time.perf_counter() - started)
+        return event_data
+
+    async def _publish_in_order(self):
+        while True:
+            while not self.in_flight:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            task, ingested_at, done = self.in_flight[0]
+            event_data = await task
+            self.in_flight.popleft()
+            self._finish(event_data, ingested_at, done)
+
+    def _finish(self, event_data: Optional[Dict[str, Any]], ingested_at: float, done: Optional[Callable[[], None]]):
+        if event_data is not None:
+            self.publish(event_data, ingested_at)
+        if done is not None:
+            done()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self.in_flight),
+            "dropped": self.dropped,
+            "stages": {stage.name: stage.status() for stage in self.stages},
+        }
+
+
+def parse_star_pos(spec: str) -> Tuple[float, float, float]:
+    """Converte 'x,y,z' em coordenadas galácticas"""
+    x, y, z = (float(value) for value in spec.split(","))
+    return x, y, z
+
+
+def home_distance(event_data: Dict[str, Any], home: Tuple[float, float, float] = (0.0, 0.0, 0.0)) -> Dict[str, Any]:
+    """Adiciona _distance_from_home (anos-luz) aos eventos com StarPos"""
+    star_pos = event_data.get("StarPos")
+    if star_pos and len(star_pos) == 3:
+        event_data["_distance_from_home"] = round(math.dist(star_pos, home), 2)
+    return event_data
+
+
+def _strip_localised(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: _strip_localised(item)
+            for key, item in value.items()
+            if not key.endswith("_Localised")
+        }
+    if isinstance(value, list):
+        return [_strip_localised(item) for item in value]
+    return value
+
+
+def eddn_redact(event_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza no estilo do EDDN: remove textos localizados e dados pessoais"""
+    event_data = _strip_localised(event_data)
+    for field in EDDN_REMOVED_FIELDS:
+        event_data.pop(field, None)
+    for faction in event_data.get("Factions", []):
+        for field in EDDN_REMOVED_FACTION_FIELDS:
+            faction.pop(field, None)
+    return event_data
@@ -0,0 +1,131 @@
+"""
+Elite Dangerous SSE - Profiling
+Spans de tempo por etapa, registro de eventos lentos e captura de perfis
+"""
+
+import os
+import sys
+import time
+import marshal
+import cProfile
+import threading
+from collections import Counter, deque
+from contextlib import nullcontext
+from typing import Callable, Dict, Any
+
+# Eventos lentos mantidos para consulta em /debug/trace
+SLOW_EVENT_HISTORY = 100
+# Intervalo entre amostras do profiler por amostragem (segundos)
+SAMPLE_INTERVAL = 0.005
+
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "started")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, time.perf_counter() - self.started)
+
+
+class Tracer:
+    """Acumula contagem, tempo total e máximo por etapa; desligado custa ~nada"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.spans: Dict[str, list] = {}
+        # Spans vêm do loop, do watchdog e dos pools
+        self.lock = threading.Lock()
+
+    def span(self, name: str):
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def record(self, name: str, elapsed: float):
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                self.spans[name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+
+    def handoff(self, started: float, func: Callable, *args: Any):
+        """Executa func(*args) no loop medindo a espera desde a outra thread"""
+        self.record("loop.handoff", time.perf_counter() - started)
+        func(*args)
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                name: {
+                    "count": count,
+                    "avg_ms": round(total / count * 1000, 3),
+                    "max_ms": round(maximum * 1000, 3),
+                }
+                for name, (count, total, maximum) in sorted(self.spans.items())
+            }
+
+    def reset(self):
+        with self.lock:
+            self.spans.clear()
+
+
+class SlowEventLog:
+    """Registra eventos cujo tempo entre a leitura e a publicação passa do limite"""
+
+    def __init__(self, threshold_ms: float, size: int = SLOW_EVENT_HISTORY):
+        self.threshold = threshold_ms / 1000
+        self.events: deque = deque(maxlen=size)
+
+    def check(self, event_id: int, event_data: Dict[str, Any], ingested_at: float):
+        """ingested_at é o instante da leitura neste processo, em time.monotonic()"""
+        elapsed = time.monotonic() - ingested_at
+        if elapsed > self.threshold:
+            self.events.append({
+                "id": event_id,
+                "event": event_data.get("event"),
+                "commander": event_data.get("_commander"),
+                "ingest_to_publish_ms": round(elapsed * 1000, 1),
+                "server_timestamp": event_data.get("_server_timestamp"),
+            })
+            print(f"🐢 Evento lento: {event_data.get('event')} #{event_id} publicado {elapsed * 1000:.0f} ms após a leitura")
+
+
+def sample_stacks(seconds: float, interval: float = SAMPLE_INTERVAL) -> bytes:
+    """Amostra as pilhas de todas as threads; retorna no formato 'folded'
+
+    Cada linha é 'thread;func (arquivo:linha);... contagem', o formato aceito
+    por flamegraph.pl e pelo speedscope.
+    """
+    own_thread = threading.get_ident()
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode("utf-8")
+
+
+def cprofile_stats(profiler: cProfile.Profile) -> bytes:
+    """Serializa um cProfile no formato lido por pstats.Stats / snakeviz"""
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
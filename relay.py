@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Elite Dangerous SSE Relay
+Agregador que assina vários servidores SSE (um por piloto) e retransmite
+todos os eventos em um único stream, marcados com o comandante de origem
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Optional, Callable, Dict, Any, List, Tuple
+import httpx
+
+# Eventos pendentes por upstream antes de descartar os mais antigos
+RELAY_BUFFER_SIZE = 1000
+# Espera inicial e máxima entre tentativas de reconexão (segundos)
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+# Conexões keep-alive mantidas no pool compartilhado
+MAX_CONNECTIONS = 100
+
+
+def parse_upstreams(spec: str) -> List[Tuple[str, str]]:
+    """Interpreta 'nome=url,url,...' em uma lista de (nome, url)"""
+    upstreams = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        label, url = item.split("=", 1) if "=" in item.split("://", 1)[0] else ("", item)
+        url = url.rstrip("/")
+        if not url.endswith("/events"):
+            url += "/events"
+        upstreams.append((label or url, url))
+    return upstreams
+
+
+class UpstreamFeed:
+    """Assinatura de um servidor SSE upstream com buffer limitado"""
+
+    def __init__(self, label: str, url: str, buffer_size: int = RELAY_BUFFER_SIZE):
+        self.label = label
+        self.url = url
+        self.buffer: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.last_event_id: Optional[str] = None
+        # Comandante por origem do upstream (um server.py pode vigiar várias pastas)
+        self.commanders: Dict[str, str] = {}
+        self.connected = False
+        self.received = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    async def run(self, client: httpx.AsyncClient):
+        """Mantém a conexão com o upstream, reconectando com backoff"""
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                await self._consume(client)
+                delay = RECONNECT_DELAY
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Upstream {self.label} indisponível: {e}")
+            self.connected = False
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def _consume(self, client: httpx.AsyncClient):
+        """Lê o stream SSE do upstream até a conexão cair"""
+        headers = {"Accept": "text/event-stream"}
+        if self.last_event_id is not None:
+            headers["Last-Event-ID"] = self.last_event_id
+
+        async with client.stream("GET", self.url, headers=headers) as response:
+            response.raise_for_status()
+            self.connected = True
+            print(f"🔗 Conectado ao upstream {self.label}")
+
+            event_id, event_name, data_lines = None, None, []
+            async for line in response.aiter_lines():
+                if not line:
+                    # Linha vazia encerra o evento
+                    if data_lines:
+                        self._dispatch(event_id, event_name, "\n".join(data_lines))
+                    event_id, event_name, data_lines = None, None, []
+                    continue
+                if line.startswith(":"):
+                    continue
+                field, _, value = line.partition(":")
+                if value.startswith(" "):
+                    value = value[1:]
+                if field == "data":
+                    data_lines.append(value)
+                elif field == "event":
+                    event_name = value
+                elif field == "id":
+                    event_id = value
+
+    def _dispatch(self, event_id: Optional[str], event_name: Optional[str], data: str):
+        """Marca o evento com a origem e o coloca no buffer"""
+        if event_id is not None:
+            self.last_event_id = event_id
+        if event_name == "connected":
+            return
+        try:
+            event_data = json.loads(data)
+        except json.JSONDecodeError:
+            return
+
+        upstream_source = event_data.get("_source")
+        source = upstream_source or self.label
+
+        # Acompanha o comandante ativo em cada origem do upstream
+        if event_data.get("event") == "Commander" and event_data.get("Name"):
+            self.commanders[source] = event_data["Name"]
+        elif event_data.get("event") == "LoadGame" and event_data.get("Commander"):
+            self.commanders[source] = event_data["Commander"]
+
+        # O server.py usa a origem (caminho da pasta) como _commander enquanto
+        # não conhece o comandante; só um nome diferente da origem é confiável
+        upstream_commander = event_data.get("_commander")
+        if upstream_commander and upstream_commander != upstream_source:
+            self.commanders[source] = upstream_commander
+        if upstream_source is not None:
+            event_data["_upstream_source"] = upstream_source
+        # Nunca herda o comandante de outra origem do mesmo upstream
+        event_data["_commander"] = self.commanders.get(source, self.label)
+        event_data["_source"] = self.label
+
+        self.received += 1
+        if self.buffer.full():
+            self.buffer.get_nowait()
+            self.dropped += 1
+        self.buffer.put_nowait(event_data)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "commanders": dict(self.commanders),
+            "last_event_id": self.last_event_id,
+            "received": self.received,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+        }
+
+
+class SSERelay:
+    """Une vários upstreams SSE em um único fluxo de eventos"""
+
+    def __init__(
+        self,
+        upstreams: List[Tuple[str, str]],
+        publish: Callable[[Dict[str, Any]], None],
+        buffer_size: int = RELAY_BUFFER_SIZE,
+    ):
+        self.feeds = [UpstreamFeed(label, url, buffer_size) for label, url in upstreams]
+        self.publish = publish
+        self.client: Optional[httpx.AsyncClient] = None
+        self.tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Abre o pool de conexões e inicia a assinatura de todos os upstreams"""
+        # Um único cliente: conexões keep-alive reaproveitadas entre reconexões
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, read=None),
+            limits=httpx.Limits(
+                max_connections=max(MAX_CONNECTIONS, len(self.feeds)),
+                max_keepalive_connections=max(MAX_CONNECTIONS, len(self.feeds)),
+            ),
+        )
+        for feed in self.feeds:
+            self.tasks.append(asyncio.create_task(feed.run(self.client)))
+            self.tasks.append(asyncio.create_task(self._forward(feed)))
+        print(f"🔀 Relay iniciado com {len(self.feeds)} upstream(s)")
+
+    async def _forward(self, feed: UpstreamFeed):
+        """Repassa os eventos do buffer do upstream para os clientes locais"""
+        while True:
+            event_data = await feed.buffer.get()
+            self.publish(event_data)
+            # Esvazia o que já estiver pendente sem voltar ao loop a cada evento
+            while not feed.buffer.empty():
+                self.publish(feed.buffer.get_nowait())
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.client:
+            await self.client.aclose()
+            self.client = None
+        print("🛑 Relay parado")
+
+    def status(self) -> Dict[str, Any]:
+        return {feed.label: feed.status() for feed in self.feeds}
+
+
+async def run_benchmark(feeds: int, events_per_feed: int, base_port: int):
+    """Mede a vazão do relay contra servidores upstream simulados locais"""
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    def create_standin(name: str) -> FastAPI:
+        standin = FastAPI()
+        # Mesmos metadados que o server.py adiciona a cada evento
+        metadata = {
+            "_journal_file": "Journal.bench.01.log",
+            "_commander": name,
+            "_source": f"/bench/{name}",
+        }
+
+        def message(event_id: int, event_data: Dict[str, Any]) -> str:
+            event_data.update(metadata, _server_timestamp=datetime.utcnow().isoformat() + "Z")
+            return f"id: {event_id}\nevent: {event_data['event']}\ndata: {json.dumps(event_data)}\n\n"
+
+        @standin.get("/events")
+        async def sse_endpoint():
+            async def generate():
+                yield "event: connected\ndata: {}\n\n"
+                yield message(1, {"event": "Commander", "Name": name})
+                for i in range(events_per_feed):
+                    yield message(i + 2, {"event": "FSDJump", "JumpDist": i})
+                await asyncio.Event().wait()
+            return StreamingResponse(generate(), media_type="text/event-stream")
+
+        return standin
+
+    servers = []
+    for i in range(feeds):
+        config = uvicorn.Config(create_standin(f"CMDR{i}"), host="127.0.0.1", port=base_port + i, log_level="warning")
+        server = uvicorn.Server(config)
+        servers.append((server, asyncio.create_task(server.serve())))
+    while not all(server.started for server, _ in servers):
+        await asyncio.sleep(0.05)
+
+    expected = feeds * (events_per_feed + 1)
+    received = 0
+    done = asyncio.Event()
+
+    def count(event_data):
+        nonlocal received
+        received += 1
+        if received + sum(feed.dropped for feed in relay.feeds) >= expected:
+            done.set()
+
+    relay = SSERelay([(f"CMDR{i}", f"http://127.0.0.1:{base_port + i}/events") for i in range(feeds)], count)
+    started = time.perf_counter()
+    await relay.start()
+    await done.wait()
+    elapsed = time.perf_counter() - started
+    await relay.stop()
+    for server, task in servers:
+        server.should_exit = True
+    await asyncio.gather(*(task for _, task in servers), return_exceptions=True)
+
+    dropped = sum(feed.dropped for feed in relay.feeds)
+    print(f"📊 {received} eventos de {feeds} upstreams em {elapsed:.2f}s ({received / elapsed:,.0f} eventos/s, {dropped} descartados)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay agregador de servidores Elite Dangerous SSE")
+    parser.add_argument("upstreams", nargs="*", help="URLs dos servidores upstream (opcionalmente nome=url)")
+    parser.add_argument("--bench", type=int, metavar="N", help="mede a vazão com N upstreams simulados locais")
+    parser.add_argument("--bench-events", type=int, default=10000, help="eventos enviados por upstream simulado")
+    parser.add_argument("--bench-port", type=int, default=9100, help="primeira porta dos upstreams simulados")
+    args = parser.parse_args()
+
+    if args.bench:
+        asyncio.run(run_benchmark(args.bench, args.bench_events, args.bench_port))
+        return
+
+    if args.upstreams:
+        os.environ["ELITE_RELAY_UPSTREAMS"] = ",".join(args.upstreams)
+    if not os.getenv("ELITE_RELAY_UPSTREAMS"):
+        parser.error("informe ao menos um upstream ou defina ELITE_RELAY_UPSTREAMS")
+
+    import uvicorn
+    from server import app, HOST, PORT
+    uvicorn.run(app, host=HOST, port=PORT, log_level="info", access_log=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,30 @@ Servidor SSE para transmitir eventos do Elite Dangerous em tempo real
 """
 
 import os
+import re
 import sys
 import json
+import mmap
 import time
+import zlib
 import asyncio
+import cProfile
+from functools import partial
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, AsyncGenerator
+from datetime import datetime, timezone
+from collections import deque
+from typing import Optional, AsyncGenerator, Iterator, List, Tuple, Set, Dict, Any, Callable
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi import FastAPI, Request, HTTPException, Query
+from fastapi.responses import StreamingResponse, Response
+from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from stats import StatsEngine
+from pipeline import EventPipeline, home_distance, eddn_redact, parse_star_pos
+from snapshot import write_snapshot, load_snapshot
+from profiling import Tracer, SlowEventLog, sample_stacks, cprofile_stats
 
 # Configurações
 HOST = "0.0.0.0"  # Permite acesso na rede local
@@ -30,6 +41,31 @@ else:
     # Para Wine/Proton no Linux
     DEFAULT_JOURNAL_PATH = Path.home() / ".steam" / "steam" / "steamapps" / "compatdata" / "359320" / "pfx" / "drive_c" / "users" / "steamuser" / "Saved Games" / "Frontier Developments" / "Elite Dangerous"
 
+# Arquivos do monitor web
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+# Eventos recentes mantidos para reenvio a clientes que reconectam (Last-Event-ID)
+EVENT_HISTORY_SIZE = 1000
+# Eventos pendentes por cliente antes de descartar os mais antigos
+CLIENT_QUEUE_SIZE = 1000
+
+# Snapshot de estado para reinício rápido (ELITE_SNAPSHOT_PATH vazio desativa)
+DEFAULT_SNAPSHOT_PATH = Path.home() / ".elite-journal-sse" / "snapshot.json"
+SNAPSHOT_INTERVAL = 30.0
+
+# Intervalo padrão (e mínimo) entre atualizações do /stats/stream, em segundos
+STATS_INTERVAL = 5.0
+MIN_STATS_INTERVAL = 1.0
+
+# Tracing por etapa e endpoints /debug (opt-in via ELITE_DEBUG=1)
+DEBUG_ENABLED = os.getenv("ELITE_DEBUG", "").lower() in ("1", "true", "yes")
+# Eventos entregues mais tarde que isso após a leitura entram no log de lentos
+SLOW_EVENT_MS = float(os.getenv("ELITE_SLOW_EVENT_MS", "500"))
+MAX_PROFILE_SECONDS = 60.0
+
+# Tamanho dos blocos usados no streaming do /export
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
 app = FastAPI(title="Elite Dangerous SSE Server")
 
 # Configurar CORS para permitir acesso de qualquer origem na rede local
@@ -41,19 +77,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Fila global para armazenar eventos
-event_queue = asyncio.Queue()
+# Monitor web servido como arquivos estáticos (cacheáveis via ETag/Last-Modified)
+static_files = StaticFiles(directory=STATIC_DIR)
+app.mount("/static", static_files, name="static")
+
 main_asyncio_loop: Optional[asyncio.AbstractEventLoop] = None
 
+# Desligado, cada span é um nullcontext compartilhado
+tracer = Tracer(enabled=DEBUG_ENABLED)
+slow_events = SlowEventLog(SLOW_EVENT_MS) if DEBUG_ENABLED else None
+
+
+def matches_commander(event_data: Dict[str, Any], commander: Optional[str]) -> bool:
+    """Verifica se o evento pertence ao comandante (ou à origem) informado"""
+    if commander is None:
+        return True
+    wanted = commander.casefold()
+    return any(
+        str(event_data.get(field) or "").casefold() == wanted
+        for field in ("_commander", "_source")
+    )
+
+
+class EventBroadcaster:
+    """Distribui cada evento para todos os clientes SSE conectados"""
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, queue_size: int = CLIENT_QUEUE_SIZE):
+        self.history: deque = deque(maxlen=history_size)
+        self.queue_size = queue_size
+        # Cada cliente pode filtrar por comandante (None recebe todos)
+        self.subscribers: Dict[asyncio.Queue, Optional[str]] = {}
+        # Callbacks em processo (ex.: a GUI), chamados no loop principal
+        self.listeners: List[Callable[[int, Dict[str, Any]], None]] = []
+        self.last_id = 0
+        self.dropped = 0
+
+    def _entry(self, event_id: int, event_data: Dict[str, Any]) -> tuple:
+        event_name = event_data.get("event", "unknown")
+        # Serializa uma única vez para todos os clientes, com e sem nome de evento
+        with tracer.span("broadcast.serialize"):
+            payload = json.dumps(event_data)
+        message = f"id: {event_id}\nevent: {event_name}\ndata: {payload}\n\n"
+        plain_message = f"id: {event_id}\ndata: {payload}\n\n"
+        return (event_id, event_data, message, plain_message)
+
+    def publish(self, event_data: Dict[str, Any], ingested_at: Optional[float] = None):
+        """Publica um evento; deve ser chamado no loop principal
+
+        ingested_at é o instante da leitura (time.monotonic()), usado pelo log
+        de eventos lentos.
+        """
+        self.last_id += 1
+        entry = self._entry(self.last_id, event_data)
+        self.history.append(entry)
+        # Medido uma vez por evento, com ou sem clientes SSE conectados
+        if slow_events and ingested_at is not None:
+            slow_events.check(self.last_id, event_data, ingested_at)
+        with tracer.span("broadcast.fanout"):
+            for queue, commander in self.subscribers.items():
+                if commander is None or matches_commander(event_data, commander):
+                    self._offer(queue, entry)
+            for listener in self.listeners:
+                listener(self.last_id, event_data)
+
+    def _offer(self, queue: asyncio.Queue, entry: tuple):
+        """Enfileira para um cliente, descartando o evento mais antigo se estiver cheio"""
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(entry)
+
+    def subscribe(self, last_event_id: Optional[int] = None, commander: Optional[str] = None) -> asyncio.Queue:
+        """Registra um cliente; reenvia o histórico posterior a last_event_id"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if last_event_id is not None:
+            for entry in self.history:
+                if entry[0] > last_event_id and matches_commander(entry[1], commander):
+                    self._offer(queue, entry)
+        self.subscribers[queue] = commander
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+
+    def restore(self, last_id: int, history: List[Tuple[int, Dict[str, Any]]]):
+        """Recarrega o histórico de um snapshot; os ids continuam a partir de last_id"""
+        self.history.clear()
+        for event_id, event_data in history:
+            self.history.append(self._entry(event_id, event_data))
+        self.last_id = max(self.last_id, last_id)
+
+    def add_listener(self, listener: Callable[[int, Dict[str, Any]], None]):
+        """Registra um callback em processo; não deve bloquear"""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int, Dict[str, Any]], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+
+broadcaster = EventBroadcaster()
+
+# Pipeline de processamento entre a leitura dos journals e a publicação
+pipeline = EventPipeline(broadcaster.publish)
+
+# Estatísticas ao vivo alimentadas pelos eventos brutos, antes das etapas
+# (ELITE_REDACT_PERSONAL remove JumpDist, por exemplo)
+stats_engine = StatsEngine()
+pipeline.add_listener(stats_engine.record)
+
+# Etapas embutidas, ativadas por variáveis de ambiente
+if os.getenv("ELITE_HOME_STARPOS"):
+    pipeline.register("home_distance", partial(home_distance, home=parse_star_pos(os.environ["ELITE_HOME_STARPOS"])))
+if os.getenv("ELITE_REDACT_PERSONAL"):
+    pipeline.register("eddn_redact", eddn_redact, pool="thread", fail_closed=True)
+
 
 class JournalEventHandler(FileSystemEventHandler):
     """Handler para monitorar mudanças nos arquivos de journal"""
     
-    def __init__(self, journal_path: Path, main_loop: asyncio.AbstractEventLoop):
+    def __init__(self, journal_path: Path, main_loop: asyncio.AbstractEventLoop, source: Optional[str] = None):
         self.journal_path = journal_path
         self.main_loop = main_loop
+        self.source = source or str(journal_path)
+        self.commander: Optional[str] = None
         self.current_file: Optional[Path] = None
         self.file_position = 0
+        # (arquivo, posição) do fim do último evento que saiu do pipeline; é o que
+        # vai para o snapshot. Atualizado só no loop, como uma única tupla
+        self.published: Optional[Tuple[str, int]] = None
         self.find_latest_journal()
     
     def find_latest_journal(self):
@@ -67,10 +219,57 @@ class JournalEventHandler(FileSystemEventHandler):
             if journal_files:
                 self.current_file = journal_files[0]
                 self.file_position = self.current_file.stat().st_size
-                print(f"📁 Monitorando: {self.current_file.name}")
+                self.published = (self.current_file.name, self.file_position)
+                self.find_commander()
+                print(f"📁 Monitorando: {self.current_file.name} ({self.commander or self.source})")
         except Exception as e:
             print(f"❌ Erro ao procurar journals: {e}")
     
+    def find_commander(self):
+        """Identifica o comandante pelo último evento Commander/LoadGame já gravado"""
+        with open(self.current_file, 'rb') as f:
+            for line in f:
+                if b'"Commander"' in line or b'"LoadGame"' in line:
+                    try:
+                        self.track_commander(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass
+    
+    def track_commander(self, event_data: dict):
+        """Atualiza o comandante ativo a partir dos eventos de login"""
+        if event_data.get("event") == "Commander":
+            self.commander = event_data.get("Name", self.commander)
+        elif event_data.get("event") == "LoadGame":
+            self.commander = event_data.get("Commander", self.commander)
+    
+    def resume(self, saved: Dict[str, Any]):
+        """Retoma a leitura de onde o snapshot parou, lendo só o que foi escrito depois"""
+        saved_file = self.journal_path / saved["current_file"]
+        if not saved_file.exists():
+            return
+        self.commander = saved.get("commander") or self.commander
+        
+        # Journals criados depois do snapshot são lidos por inteiro, em ordem
+        saved_mtime = saved_file.stat().st_mtime
+        newer_files = sorted(
+            (p for p in self.journal_path.glob("Journal.*.log") if p != saved_file and p.stat().st_mtime >= saved_mtime),
+            key=lambda p: p.stat().st_mtime
+        )
+        
+        self.current_file = saved_file
+        self.file_position = min(saved["file_position"], saved_file.stat().st_size)
+        self.published = (saved_file.name, self.file_position)
+        print(f"♻️  Retomando {saved_file.name} a partir do byte {self.file_position}")
+        self.read_new_events()
+        for journal_file in newer_files:
+            self.current_file = journal_file
+            self.file_position = 0
+            self.read_new_events()
+    
+    def mark_published(self, file_name: str, position: int):
+        """Callback done do pipeline: o evento que termina em position foi entregue"""
+        self.published = (file_name, position)
+    
     def on_modified(self, event):
         """Chamado quando um arquivo é modificado"""
         if event.is_directory:
@@ -80,14 +279,15 @@ class JournalEventHandler(FileSystemEventHandler):
         
         # Verifica se é um arquivo de journal
         if file_path.suffix == ".log" and file_path.name.startswith("Journal."):
-            # Se é um arquivo novo mais recente, atualiza
-            if self.current_file is None or file_path.stat().st_mtime > self.current_file.stat().st_mtime:
-                self.current_file = file_path
-                self.file_position = 0
-                print(f"📁 Novo journal detectado: {file_path.name}")
-            
-            # Lê novas linhas do arquivo
-            self.read_new_events()
+            with tracer.span("watchdog.on_modified"):
+                # Se é um arquivo novo mais recente, atualiza
+                if self.current_file is None or file_path.stat().st_mtime > self.current_file.stat().st_mtime:
+                    self.current_file = file_path
+                    self.file_position = 0
+                    print(f"📁 Novo journal detectado: {file_path.name}")
+                
+                # Lê novas linhas do arquivo
+                self.read_new_events()
     
     def read_new_events(self):
         """Lê novos eventos do arquivo de journal"""
@@ -95,71 +295,116 @@ class JournalEventHandler(FileSystemEventHandler):
             return
         
         try:
-            with open(self.current_file, 'r', encoding='utf-8') as f:
+            # Modo binário: a posição é contada pelos bytes lidos (tell() não funciona
+            # durante a iteração em modo texto)
+            with open(self.current_file, 'rb') as f, tracer.span("journal.read"):
                 f.seek(self.file_position)
                 
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        # Salva a posição antes de processar a linha
-                        line_start_position = self.file_position
-                        
-                        try:
+                for raw_line in f:
+                    # Linha ainda incompleta: o jogo termina de escrevê-la depois
+                    if not raw_line.endswith(b"\n"):
+                        break
+                    
+                    line = raw_line.strip()
+                    if not line:
+                        self.file_position += len(raw_line)
+                        continue
+                    
+                    try:
+                        with tracer.span("journal.json_loads"):
                             event_data = json.loads(line)
-                            # Adiciona metadados
-                            event_data["_server_timestamp"] = datetime.utcnow().isoformat() + "Z"
-                            event_data["_journal_file"] = self.current_file.name
-                            
-                            # Corrigido: injeta corrotina usando o loop principal passado pela main
-                            asyncio.run_coroutine_threadsafe(
-                                event_queue.put(event_data),
-                                self.main_loop
-                            )
-                            print(f"📡 Evento: {event_data.get('event', 'Unknown')}")
-                            
-                            # Atualiza a posição somente após processar com sucesso
-                            self.file_position = f.tell()
-                            
-                        except json.JSONDecodeError as e:
-                            print(f"⚠️  JSON inválido na linha (pulando): {e}")
-                            # Mesmo com erro de JSON, avança a posição para não reprocessar a mesma linha
-                            self.file_position = f.tell()
-                        except Exception as e:
-                            print(f"❌ Erro ao processar evento: {e}")
-                            # Em caso de erro grave, mantém a posição anterior para retentar
-                            # NÃO atualiza file_position aqui
-                            break
+                        self.track_commander(event_data)
+                        # Adiciona metadados
+                        event_data["_server_timestamp"] = datetime.utcnow().isoformat() + "Z"
+                        event_data["_journal_file"] = self.current_file.name
+                        event_data["_commander"] = self.commander or self.source
+                        event_data["_source"] = self.source
+                        
+                        # Entrega ao pipeline no loop principal passado pela main
+                        ingested_at = time.monotonic()
+                        done = partial(self.mark_published, self.current_file.name, self.file_position + len(raw_line))
+                        if tracer.enabled:
+                            self.main_loop.call_soon_threadsafe(tracer.handoff, time.perf_counter(), pipeline.submit, event_data, ingested_at, done)
+                        else:
+                            self.main_loop.call_soon_threadsafe(pipeline.submit, event_data, ingested_at, done)
+                        print(f"📡 Evento: {event_data.get('event', 'Unknown')}")
+                        
+                        # Atualiza a posição somente após processar com sucesso
+                        self.file_position += len(raw_line)
+                        
+                    except json.JSONDecodeError as e:
+                        print(f"⚠️  JSON inválido na linha (pulando): {e}")
+                        # Mesmo com erro de JSON, avança a posição para não reprocessar a mesma linha
+                        self.file_position += len(raw_line)
+                    except Exception as e:
+                        print(f"❌ Erro ao processar evento: {e}")
+                        # Em caso de erro grave, mantém a posição anterior para retentar
+                        break
                             
         except Exception as e:
             print(f"❌ Erro ao ler arquivo: {e}")
 
 
-# Observer global
+# Observer global (um único observer atende todas as pastas de journals)
 observer: Optional[Observer] = None
-event_handler: Optional[JournalEventHandler] = None
+event_handlers: List[JournalEventHandler] = []
+# Relay de upstreams (modo agregador)
+relay = None
+
 
+def parse_journal_paths(spec: str) -> List[Tuple[Optional[str], Path]]:
+    """Interpreta uma lista de pastas separadas por os.pathsep, opcionalmente 'nome=pasta'"""
+    journal_paths = []
+    for item in spec.split(os.pathsep):
+        item = item.strip()
+        if not item:
+            continue
+        label, _, path = item.rpartition("=")
+        journal_paths.append((label or None, Path(path).expanduser()))
+    return journal_paths
 
-def start_monitoring(journal_path: Path):
-    """Inicia o monitoramento dos arquivos de journal"""
-    global observer, event_handler, main_asyncio_loop
+
+def start_monitoring(journal_paths, resume: Optional[Dict[str, Dict[str, Any]]] = None):
+    """Inicia o monitoramento dos arquivos de journal
+
+    Aceita uma pasta ou uma lista de pastas/(nome, pasta), uma por comandante.
+    Com resume (posições de um snapshot, por origem), cada pasta continua de
+    onde parou em vez do fim do journal atual.
+    """
+    global observer, main_asyncio_loop
     
-    if not journal_path.exists():
-        print(f"❌ Pasta de journals não encontrada: {journal_path}")
-        print(f"   Por favor, configure o caminho correto.")
-        return False
+    if isinstance(journal_paths, (str, Path)):
+        journal_paths = [journal_paths]
+    journal_paths = [item if isinstance(item, tuple) else (None, Path(item)) for item in journal_paths]
     
-    print(f"🔍 Iniciando monitoramento em: {journal_path}")
+    # Usa o loop em execução (a GUI cria um loop novo a cada início do servidor)
+    main_asyncio_loop = asyncio.get_running_loop()
     
-    # Obtém o loop principal se ainda não foi obtido
-    if main_asyncio_loop is None:
-        main_asyncio_loop = asyncio.get_running_loop()
+    new_observer = Observer()
+    handlers = []
+    for source, journal_path in journal_paths:
+        if not journal_path.exists():
+            print(f"❌ Pasta de journals não encontrada: {journal_path}")
+            print(f"   Por favor, configure o caminho correto.")
+            continue
+        
+        print(f"🔍 Iniciando monitoramento em: {journal_path}")
+        handler = JournalEventHandler(journal_path, main_asyncio_loop, source)
+        saved = (resume or {}).get(handler.source)
+        if saved and Path(saved["journal_path"]) == journal_path:
+            # Antes de iniciar o observer, para não concorrer com on_modified
+            handler.resume(saved)
+        new_observer.schedule(handler, str(journal_path), recursive=False)
+        handlers.append(handler)
     
-    event_handler = JournalEventHandler(journal_path, main_asyncio_loop)
-    observer = Observer()
-    observer.schedule(event_handler, str(journal_path), recursive=False)
-    observer.start()
+    event_handlers[:] = handlers
+    if not handlers:
+        return False
     
-    print("✅ Monitoramento iniciado com sucesso!")
+    new_observer.start()
+    observer = new_observer
+    
+    print(f"✅ Monitoramento iniciado com sucesso! ({len(handlers)} pasta(s))")
     return True
 
 
@@ -169,11 +414,18 @@ def stop_monitoring():
     if observer:
         observer.stop()
         observer.join()
+        observer = None
         print("🛑 Monitoramento parado")
 
 
-async def event_generator(request: Request) -> AsyncGenerator[str, None]:
+async def event_generator(
+    request: Request,
+    last_event_id: Optional[int] = None,
+    commander: Optional[str] = None,
+    named: bool = True,
+) -> AsyncGenerator[str, None]:
     """Gerador de eventos SSE"""
+    queue = broadcaster.subscribe(last_event_id, commander)
     try:
         # Envia evento de conexão estabelecida
         yield f"event: connected\n"
@@ -187,12 +439,11 @@ async def event_generator(request: Request) -> AsyncGenerator[str, None]:
             
             try:
                 # Aguarda por novos eventos com timeout
-                event_data = await asyncio.wait_for(event_queue.get(), timeout=30.0)
+                event_id, event_data, message, plain_message = await asyncio.wait_for(queue.get(), timeout=30.0)
                 
-                # Formata o evento SSE
-                event_name = event_data.get("event", "unknown")
-                yield f"event: {event_name}\n"
-                yield f"data: {json.dumps(event_data)}\n\n"
+                # Evento SSE já formatado pelo broadcaster
+                with tracer.span("client.write"):
+                    yield message if named else plain_message
                 
             except asyncio.TimeoutError:
                 # Envia heartbeat a cada 30 segundos
@@ -201,14 +452,26 @@ async def event_generator(request: Request) -> AsyncGenerator[str, None]:
     except Exception as e:
         print(f"❌ Erro no gerador de eventos: {e}")
     finally:
+        broadcaster.unsubscribe(queue)
         print("🔌 Conexão SSE encerrada")
 
 
 @app.get("/events")
-async def sse_endpoint(request: Request):
-    """Endpoint SSE principal"""
+async def sse_endpoint(request: Request, commander: Optional[str] = None, named: bool = True):
+    """Endpoint SSE principal (opcionalmente filtrado por comandante)
+
+    Com named=false os eventos chegam sem o campo 'event:', ou seja, todos
+    disparam o onmessage do EventSource.
+    """
+    # Clientes que reconectam informam o último id recebido
+    last_event_id = request.headers.get("last-event-id")
     return StreamingResponse(
-        event_generator(request),
+        event_generator(
+            request,
+            int(last_event_id) if last_event_id and last_event_id.isdigit() else None,
+            commander,
+            named,
+        ),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -218,263 +481,107 @@ async def sse_endpoint(request: Request):
     )
 
 
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    """Página inicial com cliente de teste"""
-    html_content = """
-    <!DOCTYPE html>
-    <html lang="pt-BR">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Elite Dangerous SSE - Monitor</title>
-        <style>
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }
-            body {
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);
-                color: #fff;
-                padding: 20px;
-                min-height: 100vh;
-            }
-            .container {
-                max-width: 1200px;
-                margin: 0 auto;
-            }
-            h1 {
-                text-align: center;
-                margin-bottom: 30px;
-                font-size: 2.5em;
-                text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-            }
-            .status {
-                background: rgba(255,255,255,0.1);
-                padding: 15px;
-                border-radius: 10px;
-                margin-bottom: 20px;
-                text-align: center;
-                backdrop-filter: blur(10px);
-            }
-            .status.connected {
-                background: rgba(76, 175, 80, 0.3);
-            }
-            .status.disconnected {
-                background: rgba(244, 67, 54, 0.3);
-            }
-            .events-container {
-                background: rgba(0,0,0,0.3);
-                border-radius: 10px;
-                padding: 20px;
-                max-height: 600px;
-                overflow-y: auto;
-                backdrop-filter: blur(10px);
-            }
-            .event {
-                background: rgba(255,255,255,0.1);
-                padding: 15px;
-                margin-bottom: 10px;
-                border-radius: 8px;
-                border-left: 4px solid #4CAF50;
-                animation: slideIn 0.3s ease;
-            }
-            @keyframes slideIn {
-                from {
-                    opacity: 0;
-                    transform: translateX(-20px);
-                }
-                to {
-                    opacity: 1;
-                    transform: translateX(0);
-                }
-            }
-            .event-type {
-                font-weight: bold;
-                color: #4CAF50;
-                margin-bottom: 5px;
-            }
-            .event-timestamp {
-                color: #aaa;
-                font-size: 0.85em;
-                margin-bottom: 8px;
-            }
-            .event-data {
-                font-family: 'Courier New', monospace;
-                font-size: 0.9em;
-                background: rgba(0,0,0,0.3);
-                padding: 10px;
-                border-radius: 5px;
-                overflow-x: auto;
-            }
-            .controls {
-                margin-bottom: 20px;
-                text-align: center;
-            }
-            button {
-                background: #4CAF50;
-                color: white;
-                border: none;
-                padding: 10px 20px;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 1em;
-                margin: 0 5px;
-                transition: background 0.3s;
-            }
-            button:hover {
-                background: #45a049;
-            }
-            button:disabled {
-                background: #ccc;
-                cursor: not-allowed;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🚀 Elite Dangerous - Monitor de Eventos</h1>
-            
-            <div id="status" class="status disconnected">
-                <strong>Status:</strong> <span id="status-text">Desconectado</span>
-            </div>
-            
-            <div class="controls">
-                <button id="clearBtn" onclick="clearEvents()">🗑️ Limpar Eventos</button>
-                <button id="toggleBtn" onclick="toggleConnection()">▶️ Conectar</button>
-            </div>
-            
-            <div class="events-container" id="events">
-                <p style="text-align: center; color: #aaa;">Aguardando eventos...</p>
-            </div>
-        </div>
-        
-        <script>
-            let eventSource = null;
-            let isConnected = false;
-            const eventsContainer = document.getElementById('events');
-            const statusDiv = document.getElementById('status');
-            const statusText = document.getElementById('status-text');
-            const toggleBtn = document.getElementById('toggleBtn');
-            
-            function connect() {
-                if (isConnected) return;
-                
-                eventSource = new EventSource('/events');
-                
-                eventSource.addEventListener('connected', (e) => {
-                    const data = JSON.parse(e.data);
-                    updateStatus('Conectado', true);
-                    addEvent('connected', data, data.timestamp);
-                });
-                
-                // Listener genérico para todos os eventos
-                eventSource.onmessage = (e) => {
-                    try {
-                        const data = JSON.parse(e.data);
-                        addEvent(data.event || 'unknown', data, data.timestamp);
-                    } catch (err) {
-                        console.error('Erro ao processar evento:', err);
-                    }
-                };
-                
-                // Listeners para eventos específicos do Elite Dangerous
-                const eventTypes = [
-                    'Fileheader', 'Location', 'FSDJump', 'Docked', 'Undocked',
-                    'SupercruiseEntry', 'SupercruiseExit', 'Scan', 'Materials',
-                    'CargoTransfer', 'MissionAccepted', 'MissionCompleted',
-                    'Bounty', 'ShipTargeted', 'ReceiveText'
-                ];
-                
-                eventTypes.forEach(eventType => {
-                    eventSource.addEventListener(eventType, (e) => {
-                        const data = JSON.parse(e.data);
-                        addEvent(eventType, data, data.timestamp);
-                    });
-                });
-                
-                eventSource.onerror = (e) => {
-                    console.error('Erro SSE:', e);
-                    updateStatus('Erro na conexão', false);
-                    disconnect();
-                };
-                
-                isConnected = true;
-            }
-            
-            function disconnect() {
-                if (eventSource) {
-                    eventSource.close();
-                    eventSource = null;
-                }
-                updateStatus('Desconectado', false);
-                isConnected = false;
-            }
-            
-            function toggleConnection() {
-                if (isConnected) {
-                    disconnect();
-                    toggleBtn.textContent = '▶️ Conectar';
-                } else {
-                    connect();
-                    toggleBtn.textContent = '⏸️ Desconectar';
-                }
-            }
-            
-            function updateStatus(text, connected) {
-                statusText.textContent = text;
-                statusDiv.className = 'status ' + (connected ? 'connected' : 'disconnected');
-            }
-            
-            function addEvent(type, data, timestamp) {
-                const eventDiv = document.createElement('div');
-                eventDiv.className = 'event';
-                
-                const eventType = document.createElement('div');
-                eventType.className = 'event-type';
-                eventType.textContent = `📡 ${type}`;
-                
-                const eventTimestamp = document.createElement('div');
-                eventTimestamp.className = 'event-timestamp';
-                eventTimestamp.textContent = new Date(timestamp || data._server_timestamp).toLocaleString('pt-BR');
-                
-                const eventData = document.createElement('div');
-                eventData.className = 'event-data';
-                eventData.textContent = JSON.stringify(data, null, 2);
-                
-                eventDiv.appendChild(eventType);
-                eventDiv.appendChild(eventTimestamp);
-                eventDiv.appendChild(eventData);
-                
-                // Remove mensagem de aguardando
-                if (eventsContainer.querySelector('p')) {
-                    eventsContainer.innerHTML = '';
-                }
-                
-                eventsContainer.insertBefore(eventDiv, eventsContainer.firstChild);
-                
-                // Limita a 50 eventos
-                while (eventsContainer.children.length > 50) {
-                    eventsContainer.removeChild(eventsContainer.lastChild);
-                }
-            }
-            
-            function clearEvents() {
-                eventsContainer.innerHTML = '<p style="text-align: center; color: #aaa;">Aguardando eventos...</p>';
-            }
-            
-            // Auto-conecta ao carregar
-            window.addEventListener('load', () => {
-                connect();
-                toggleBtn.textContent = '⏸️ Desconectar';
-            });
-        </script>
-    </body>
-    </html>
+@app.get("/stats")
+async def stats(commander: Optional[str] = None):
+    """Taxas ao vivo em janelas deslizantes (geral ou por comandante)"""
+    snapshot = stats_engine.snapshot(commander)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail=f"Comandante não encontrado: {commander}")
+    return snapshot
+
+
+async def stats_generator(request: Request, commander: Optional[str], interval: float) -> AsyncGenerator[str, None]:
+    """Envia os agregados atuais em intervalos fixos"""
+    while not await request.is_disconnected():
+        snapshot = stats_engine.snapshot(commander)
+        yield f"event: stats\ndata: {json.dumps(snapshot)}\n\n"
+        await asyncio.sleep(interval)
+
+
+@app.get("/stats/stream")
+async def stats_stream(request: Request, commander: Optional[str] = None, interval: float = STATS_INTERVAL):
+    """Canal SSE com as estatísticas ao vivo"""
+    return StreamingResponse(
+        stats_generator(request, commander, max(interval, MIN_STATS_INTERVAL)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+def require_debug():
+    if not DEBUG_ENABLED:
+        raise HTTPException(status_code=404, detail="Endpoints de debug desativados (defina ELITE_DEBUG=1)")
+
+
+profile_running = False
+
+
+@app.get("/debug/trace")
+async def debug_trace(reset: bool = False):
+    """Tempo por etapa da ingestão/entrega e eventos lentos recentes"""
+    require_debug()
+    trace = {
+        "spans": tracer.status(),
+        "pipeline": pipeline.status(),
+        "slow_event_threshold_ms": SLOW_EVENT_MS,
+        "slow_events": list(slow_events.events),
+    }
+    if reset:
+        tracer.reset()
+        slow_events.events.clear()
+    return trace
+
+
+@app.get("/debug/profile")
+async def debug_profile(seconds: float = 10.0, mode: str = "sample"):
+    """Captura um perfil por N segundos
+
+    mode=sample amostra as pilhas de todas as threads (loop, watchdog, pools)
+    e retorna o formato 'folded' para flame graphs; mode=cprofile roda o
+    cProfile na thread do loop e retorna um arquivo pstats.
     """
-    return HTMLResponse(content=html_content)
+    global profile_running
+    require_debug()
+    if mode not in ("sample", "cprofile"):
+        raise HTTPException(status_code=400, detail=f"Modo inválido: {mode} (use sample ou cprofile)")
+    if profile_running:
+        raise HTTPException(status_code=409, detail="Já existe uma captura em andamento")
+    
+    seconds = min(max(seconds, 0.1), MAX_PROFILE_SECONDS)
+    profile_running = True
+    print(f"🔬 Capturando perfil ({mode}) por {seconds:.1f}s")
+    try:
+        if mode == "sample":
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(None, sample_stacks, seconds)
+            filename, media_type = "profile.folded", "text/plain"
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            data = cprofile_stats(profiler)
+            filename, media_type = "profile.pstats", "application/octet-stream"
+    finally:
+        profile_running = False
+    
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.get("/", include_in_schema=False)
+async def root(request: Request):
+    """Página inicial com o monitor de eventos (arquivo estático, com ETag)"""
+    return await static_files.get_response("index.html", request.scope)
 
 
 @app.get("/health")
@@ -483,10 +590,327 @@ async def health():
     return {
         "status": "ok",
         "monitoring": observer is not None and observer.is_alive() if observer else False,
-        "current_journal": event_handler.current_file.name if event_handler and event_handler.current_file else None
+        "current_journal": event_handlers[0].current_file.name if event_handlers and event_handlers[0].current_file else None,
+        "journals": [
+            {
+                "source": handler.source,
+                "commander": handler.commander,
+                "current_journal": handler.current_file.name if handler.current_file else None,
+            }
+            for handler in event_handlers
+        ],
+        "clients": len(broadcaster.subscribers),
+        "upstreams": relay.status() if relay else None,
+        "pipeline": pipeline.status(),
     }
 
 
+def get_journal_paths() -> List[Tuple[Optional[str], Path]]:
+    """Retorna as pastas de journals configuradas (ELITE_JOURNAL_PATH ou padrão)"""
+    if observer is not None and event_handlers:
+        return [(handler.source, handler.journal_path) for handler in event_handlers]
+    # Sem nenhuma pasta válida (ex.: ELITE_JOURNAL_PATH=";") usa o padrão
+    return parse_journal_paths(os.getenv("ELITE_JOURNAL_PATH", "")) or [(None, DEFAULT_JOURNAL_PATH)]
+
+
+# Extrai timestamp e tipo do início da linha sem decodificar o JSON inteiro
+_EVENT_HEAD_RE = re.compile(rb'"timestamp"\s*:\s*"([^"]+)"\s*,\s*"event"\s*:\s*"([^"]+)"')
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_export_timestamp(value: Optional[str], name: str) -> Optional[str]:
+    """Normaliza um timestamp ISO para o formato dos journals (comparável como string)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Timestamp inválido em '{name}': {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def list_journal_segments(journal_path: Path) -> List[Tuple[Path, int]]:
+    """Lista os journals em ordem cronológica com o tamanho até a última linha completa"""
+    segments = []
+    journal_files = sorted(journal_path.glob("Journal.*.log"), key=lambda p: p.stat().st_mtime)
+    for path in journal_files:
+        size = path.stat().st_size
+        if size == 0:
+            continue
+        # Ignora a linha parcial que o jogo ainda pode estar escrevendo
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            complete = mm.rfind(b"\n") + 1
+        if complete:
+            segments.append((path, complete))
+    return segments
+
+
+def parse_range_header(range_header: Optional[str], total: int) -> Optional[Tuple[int, int]]:
+    """Interpreta um header Range de intervalo único; retorna (início, fim inclusivo)"""
+    if not range_header:
+        return None
+    match = _RANGE_RE.match(range_header.strip())
+    if not match:
+        # Múltiplos intervalos ou unidades desconhecidas: responde com o conteúdo completo
+        return None
+    start_text, end_text = match.groups()
+    if not start_text and not end_text:
+        return None
+    if not start_text:
+        suffix = int(end_text)
+        if suffix == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+        return max(total - suffix, 0), total - 1
+    start = int(start_text)
+    end = min(int(end_text), total - 1) if end_text else total - 1
+    if start >= total or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+    return start, end
+
+
+def iter_raw_journal_bytes(segments: List[Tuple[Path, int]], start: int, end: int) -> Iterator[bytes]:
+    """Transmite um intervalo contíguo dos journals direto do mmap, sem decodificar"""
+    offset = 0
+    for path, size in segments:
+        segment_start, segment_end = offset, offset + size
+        offset = segment_end
+        if segment_end <= start:
+            continue
+        if segment_start > end:
+            break
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            position = max(start - segment_start, 0)
+            stop = min(end + 1 - segment_start, size)
+            while position < stop:
+                chunk_end = min(position + EXPORT_CHUNK_SIZE, stop)
+                # Copia o bloco: uma view do mmap impediria fechá-lo se o cliente desconectar
+                yield mm[position:chunk_end]
+                position = chunk_end
+
+
+def iter_filtered_journal_lines(
+    journal_path: Path,
+    time_from: Optional[str],
+    time_to: Optional[str],
+    types: Optional[Set[str]],
+) -> Iterator[bytes]:
+    """Transmite as linhas dos journals que passam pelos filtros, em blocos"""
+    buffer = []
+    buffered = 0
+    for path, size in list_journal_segments(journal_path):
+        # Arquivos modificados pela última vez antes do início não têm eventos no intervalo
+        modified = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+        if time_from and modified.strftime("%Y-%m-%dT%H:%M:%SZ") < time_from:
+            continue
+        with open(path, "rb") as f:
+            remaining = size
+            for line in f:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                match = _EVENT_HEAD_RE.search(line, 0, 256)
+                if match:
+                    timestamp, event_name = match.group(1).decode(), match.group(2).decode()
+                else:
+                    try:
+                        event_data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    timestamp, event_name = event_data.get("timestamp", ""), event_data.get("event", "")
+                if time_from and timestamp < time_from:
+                    continue
+                if time_to and timestamp > time_to:
+                    continue
+                if types and event_name not in types:
+                    continue
+                line = line.rstrip(b"\r\n") + b"\n"
+                buffer.append(line)
+                buffered += len(line)
+                if buffered >= EXPORT_CHUNK_SIZE:
+                    yield b"".join(buffer)
+                    buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzip_stream(chunks: Iterator) -> Iterator[bytes]:
+    """Comprime um stream de blocos em gzip de forma incremental"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.get("/export")
+async def export_events(
+    request: Request,
+    time_from: Optional[str] = Query(None, alias="from"),
+    time_to: Optional[str] = Query(None, alias="to"),
+    types: Optional[str] = None,
+    commander: Optional[str] = None,
+    gzip: bool = False,
+):
+    """Exporta eventos históricos dos journals em NDJSON"""
+    journal_paths = get_journal_paths()
+    if commander:
+        # Escolhe a pasta do comandante (ou da origem) pedida
+        journal_paths = [
+            (handler.source, handler.journal_path)
+            for handler in event_handlers
+            if matches_commander({"_commander": handler.commander, "_source": handler.source}, commander)
+        ]
+        if not journal_paths:
+            raise HTTPException(status_code=404, detail=f"Comandante não encontrado: {commander}")
+    if len(journal_paths) > 1:
+        # Os journals de cada pasta têm sua própria ordem; exporta uma por vez
+        sources = ", ".join(str(source or path) for source, path in journal_paths)
+        raise HTTPException(status_code=400, detail=f"Várias pastas configuradas; informe 'commander' ({sources})")
+    journal_path = journal_paths[0][1]
+    if not journal_path.exists():
+        raise HTTPException(status_code=404, detail=f"Pasta de journals não encontrada: {journal_path}")
+
+    time_from = parse_export_timestamp(time_from, "from")
+    time_to = parse_export_timestamp(time_to, "to")
+    type_set = {t.strip() for t in types.split(",") if t.strip()} if types else None
+
+    headers = {"Content-Disposition": 'attachment; filename="elite-journal-export.ndjson"'}
+    media_type = "application/x-ndjson"
+
+    if time_from or time_to or type_set:
+        # Com filtro é preciso olhar cada linha; o tamanho final não é conhecido
+        body = iter_filtered_journal_lines(journal_path, time_from, time_to, type_set)
+        headers["Accept-Ranges"] = "none"
+        if gzip:
+            body = gzip_stream(body)
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+
+    # Sem filtro: os journals já são NDJSON, então os bytes são enviados como estão
+    loop = asyncio.get_running_loop()
+    segments = await loop.run_in_executor(None, list_journal_segments, journal_path)
+    total = sum(size for _, size in segments)
+
+    if gzip:
+        # Intervalos não se aplicam à representação comprimida
+        headers["Content-Encoding"] = "gzip"
+        headers["Accept-Ranges"] = "none"
+        body = gzip_stream(iter_raw_journal_bytes(segments, 0, total - 1))
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+
+    headers["Accept-Ranges"] = "bytes"
+    byte_range = parse_range_header(request.headers.get("range"), total) if total else None
+    if byte_range is None:
+        headers["Content-Length"] = str(total)
+        return StreamingResponse(iter_raw_journal_bytes(segments, 0, total - 1), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_raw_journal_bytes(segments, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def get_snapshot_path() -> Optional[Path]:
+    """Caminho do snapshot de estado; None se desativado"""
+    custom_path = os.getenv("ELITE_SNAPSHOT_PATH")
+    if custom_path is None:
+        return DEFAULT_SNAPSHOT_PATH
+    return Path(custom_path).expanduser() if custom_path else None
+
+
+def build_snapshot() -> Dict[str, Any]:
+    """Reúne o estado atual; deve ser chamado no loop principal
+
+    As posições salvas são as dos últimos eventos publicados (ou descartados
+    pelo pipeline), coerentes com o histórico e o last_id gravados junto.
+    """
+    journals = {}
+    for handler in event_handlers:
+        published = handler.published
+        if published:
+            journals[handler.source] = {
+                "journal_path": str(handler.journal_path),
+                "current_file": published[0],
+                "file_position": published[1],
+                "commander": handler.commander,
+            }
+    return {
+        "saved_at": time.time(),
+        "journals": journals,
+        "events": {
+            "last_id": broadcaster.last_id,
+            "history": [[event_id, event_data] for event_id, event_data, *_ in broadcaster.history],
+        },
+        "stats": stats_engine.state(),
+    }
+
+
+def restore_snapshot(state: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Restaura eventos recentes e estatísticas; retorna as posições dos journals
+
+    Todo o conteúdo é validado antes de alterar o estado do servidor: um
+    snapshot com estrutura inesperada levanta KeyError/TypeError/ValueError
+    sem restaurar nada pela metade.
+    """
+    StatsEngine().load_state(state["stats"])
+    last_id = int(state["events"]["last_id"])
+    history = [(int(event_id), dict(event_data)) for event_id, event_data in state["events"]["history"]]
+    journals = {
+        str(source): {
+            "journal_path": str(saved["journal_path"]),
+            "current_file": str(saved["current_file"]),
+            "file_position": int(saved["file_position"]),
+            "commander": saved.get("commander"),
+        }
+        for source, saved in state["journals"].items()
+    }
+    age = time.time() - float(state["saved_at"])
+    
+    broadcaster.restore(last_id, history)
+    stats_engine.load_state(state["stats"])
+    print(f"♻️  Snapshot restaurado: {len(broadcaster.history)} eventos recentes (de {age:.0f}s atrás)")
+    return journals
+
+
+async def save_snapshot(path: Path):
+    """Grava o snapshot fora do loop principal"""
+    state = build_snapshot()
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, write_snapshot, path, state)
+    except OSError as e:
+        print(f"❌ Erro ao gravar snapshot: {e}")
+
+
+async def snapshot_loop(path: Path):
+    """Grava o snapshot periodicamente"""
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        await save_snapshot(path)
+
+
+snapshot_task: Optional[asyncio.Task] = None
+
+
+async def start_relay(upstreams: str):
+    """Inicia o relay que assina os servidores upstream"""
+    global relay
+    from relay import SSERelay, parse_upstreams
+
+    relay = SSERelay(parse_upstreams(upstreams), pipeline.submit)
+    for label, url in parse_upstreams(upstreams):
+        print(f"🔗 Upstream: {label} ({url})")
+    await relay.start()
+
+
 @app.on_event("startup")
 async def startup_event():
     """Evento de inicialização"""
@@ -494,13 +918,40 @@ async def startup_event():
     print("🚀 Elite Dangerous SSE Server")
     print("="*60)
     
-    # Permite configurar caminho customizado via variável de ambiente
-    custom_path = os.getenv("ELITE_JOURNAL_PATH")
-    journal_path = Path(custom_path) if custom_path else DEFAULT_JOURNAL_PATH
+    pipeline.start()
+    for stage in pipeline.stages:
+        print(f"⚙️  Etapa do pipeline: {stage.name} ({stage.pool or 'inline'})")
+    
+    # Warm start: recupera o estado da execução anterior
+    global snapshot_task
+    resume = None
+    snapshot_path = get_snapshot_path()
+    if snapshot_path:
+        state = load_snapshot(snapshot_path)
+        if state:
+            try:
+                resume = restore_snapshot(state)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                # Mesmo tratamento dos snapshots ilegíveis: inicia sem estado
+                print(f"⚠️  Snapshot ignorado ({snapshot_path}): estrutura inválida ({e!r})")
+        snapshot_task = asyncio.create_task(snapshot_loop(snapshot_path))
+    
+    # Modo agregador: retransmite outros servidores em vez de ler journals locais
+    upstreams = os.getenv("ELITE_RELAY_UPSTREAMS")
+    if upstreams:
+        await start_relay(upstreams)
+        print(f"🌐 Servidor disponível em: http://localhost:{PORT}")
+        print(f"📡 Endpoint SSE: http://localhost:{PORT}/events")
+        print("="*60)
+        return
+    
+    # Permite configurar caminho(s) customizado(s) via variável de ambiente
+    journal_paths = get_journal_paths()
     
-    print(f"📂 Pasta de journals: {journal_path}")
+    for source, journal_path in journal_paths:
+        print(f"📂 Pasta de journals: {journal_path}" + (f" ({source})" if source else ""))
     
-    if start_monitoring(journal_path):
+    if start_monitoring(journal_paths, resume):
         print(f"🌐 Servidor disponível em: http://localhost:{PORT}")
         print(f"🌐 Acesso na rede local: http://<seu-ip>:{PORT}")
         print(f"📡 Endpoint SSE: http://localhost:{PORT}/events")
@@ -515,7 +966,17 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento de encerramento"""
+    global relay, snapshot_task
+    if relay:
+        await relay.stop()
+        relay = None
     stop_monitoring()
+    # Publica o que ainda está no pipeline antes de gravar as posições de leitura
+    await pipeline.stop()
+    if snapshot_task:
+        snapshot_task.cancel()
+        snapshot_task = None
+        await save_snapshot(get_snapshot_path())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+"""
+Elite Dangerous SSE - Snapshots de estado
+Grava e carrega o estado do servidor para reinícios rápidos
+"""
+
+import os
+import json
+import mmap
+import tempfile
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+# Versão do formato; snapshots de outra versão são ignorados
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path: Path, state: Dict[str, Any]):
+    """Grava o snapshot de forma atômica (arquivo temporário + rename)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = json.dumps({"version": SNAPSHOT_VERSION, **state}, separators=(",", ":")).encode("utf-8")
+    fd, temp_path = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # Leitores veem o snapshot antigo ou o novo, nunca um arquivo pela metade
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_snapshot(path: Path) -> Optional[Dict[str, Any]]:
+    """Carrega um snapshot; retorna None se não existir ou for inválido"""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            state = json.loads(mm[:])
+    except (OSError, ValueError) as e:
+        if path.exists():
+            print(f"⚠️  Snapshot ignorado ({path}): {e}")
+        return None
+    if state.get("version") != SNAPSHOT_VERSION:
+        print(f"⚠️  Snapshot ignorado ({path}): versão {state.get('version')}")
+        return None
+    return state
@@ -0,0 +1,196 @@
+// Monitor de eventos do Elite Dangerous SSE
+//
+// Os eventos recebidos vão para um buffer e são desenhados no máximo uma vez
+// por frame. A lista é virtualizada (só as linhas visíveis existem no DOM) e o
+// JSON formatado só é gerado quando um evento é selecionado.
+
+const MAX_EVENTS = 5000;   // Eventos mantidos no histórico da página
+const ROW_HEIGHT = 44;     // Altura de cada linha, incluindo o espaçamento
+const LIST_PADDING = 10;
+const OVERSCAN = 5;        // Linhas extras desenhadas acima/abaixo da área visível
+
+let eventSource = null;
+let isConnected = false;
+let pending = [];          // Eventos recebidos ainda não desenhados
+let entries = [];          // Histórico, do mais antigo para o mais recente
+let totalReceived = 0;
+let selected = null;
+let frameRequested = false;
+const rowPool = [];
+
+const eventsContainer = document.getElementById('events');
+const eventsSpacer = document.getElementById('events-spacer');
+const eventsEmpty = document.getElementById('events-empty');
+const detailPanel = document.getElementById('detail');
+const statusDiv = document.getElementById('status');
+const statusText = document.getElementById('status-text');
+const eventCount = document.getElementById('event-count');
+const toggleBtn = document.getElementById('toggleBtn');
+
+function connect() {
+    if (isConnected) return;
+
+    // named=false: todos os eventos chegam pelo onmessage, um único caminho
+    eventSource = new EventSource('/events?named=false');
+
+    eventSource.addEventListener('connected', (e) => {
+        updateStatus('Conectado', true);
+        enqueue('connected', JSON.parse(e.data));
+    });
+
+    eventSource.onmessage = (e) => {
+        try {
+            const data = JSON.parse(e.data);
+            enqueue(data.event || 'unknown', data);
+        } catch (err) {
+            console.error('Erro ao processar evento:', err);
+        }
+    };
+
+    eventSource.onerror = () => {
+        // O EventSource reconecta sozinho, enviando o Last-Event-ID
+        updateStatus('Reconectando...', false);
+    };
+
+    isConnected = true;
+    toggleBtn.textContent = '⏸️ Desconectar';
+}
+
+function disconnect() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+    updateStatus('Desconectado', false);
+    isConnected = false;
+    toggleBtn.textContent = '▶️ Conectar';
+}
+
+function toggleConnection() {
+    if (isConnected) {
+        disconnect();
+    } else {
+        connect();
+    }
+}
+
+function updateStatus(text, connected) {
+    statusText.textContent = text;
+    statusDiv.className = 'status ' + (connected ? 'connected' : 'disconnected');
+}
+
+function enqueue(type, data) {
+    // Em abas ocultas o requestAnimationFrame fica pausado: o buffer não pode
+    // passar do histórico, senão cresce sem limite até a aba voltar
+    if (pending.length >= MAX_EVENTS) {
+        pending.shift();
+        totalReceived++;
+    }
+    pending.push({ type, data, timestamp: data.timestamp || data._server_timestamp });
+    scheduleRender();
+}
+
+function scheduleRender() {
+    if (!frameRequested) {
+        frameRequested = true;
+        requestAnimationFrame(flush);
+    }
+}
+
+function flush() {
+    frameRequested = false;
+
+    if (pending.length) {
+        const added = pending.length;
+        totalReceived += added;
+        entries.push(...pending);
+        pending = [];
+        if (entries.length > MAX_EVENTS) {
+            entries.splice(0, entries.length - MAX_EVENTS);
+        }
+
+        // Mantém a posição de quem está lendo eventos mais antigos
+        if (eventsContainer.scrollTop > 0) {
+            eventsContainer.scrollTop += added * ROW_HEIGHT;
+        }
+
+        eventsEmpty.style.display = 'none';
+        eventsSpacer.style.height = (entries.length * ROW_HEIGHT + 2 * LIST_PADDING) + 'px';
+        eventCount.textContent = `📡 ${totalReceived} eventos (${entries.length} em memória)`;
+    }
+
+    renderRows();
+}
+
+function createRow() {
+    const row = document.createElement('div');
+    row.className = 'event';
+    const type = document.createElement('span');
+    type.className = 'event-type';
+    const timestamp = document.createElement('span');
+    timestamp.className = 'event-timestamp';
+    const commander = document.createElement('span');
+    commander.className = 'event-commander';
+    row.append(type, timestamp, commander);
+    row.addEventListener('click', () => select(row.entry));
+    eventsContainer.appendChild(row);
+    return row;
+}
+
+function renderRows() {
+    // O evento mais recente fica no topo: a linha i mostra entries[n - 1 - i]
+    const count = entries.length;
+    const first = Math.max(0, Math.floor((eventsContainer.scrollTop - LIST_PADDING) / ROW_HEIGHT) - OVERSCAN);
+    const visible = Math.ceil(eventsContainer.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+    const last = Math.min(count, first + visible);
+
+    while (rowPool.length < last - first) {
+        rowPool.push(createRow());
+    }
+
+    for (let i = 0; i < rowPool.length; i++) {
+        const row = rowPool[i];
+        const index = first + i;
+        if (index >= last) {
+            row.style.display = 'none';
+            continue;
+        }
+        const entry = entries[count - 1 - index];
+        row.style.display = '';
+        row.style.top = (LIST_PADDING + index * ROW_HEIGHT) + 'px';
+        if (row.entry !== entry) {
+            row.entry = entry;
+            row.children[0].textContent = `📡 ${entry.type}`;
+            row.children[1].textContent = entry.timestamp ? new Date(entry.timestamp).toLocaleString('pt-BR') : '';
+            row.children[2].textContent = entry.data._commander || '';
+        }
+        row.classList.toggle('selected', entry === selected);
+    }
+}
+
+function select(entry) {
+    selected = entry;
+    // JSON formatado só para o evento selecionado
+    const pre = document.createElement('pre');
+    pre.textContent = JSON.stringify(entry.data, null, 2);
+    detailPanel.replaceChildren(pre);
+    renderRows();
+}
+
+function clearEvents() {
+    pending = [];
+    entries = [];
+    selected = null;
+    eventsSpacer.style.height = '0px';
+    eventsEmpty.style.display = '';
+    eventCount.textContent = '';
+    detailPanel.innerHTML = '<p class="events-empty">Clique em um evento para ver os detalhes</p>';
+    renderRows();
+}
+
+eventsContainer.addEventListener('scroll', scheduleRender, { passive: true });
+document.getElementById('clearBtn').addEventListener('click', clearEvents);
+toggleBtn.addEventListener('click', toggleConnection);
+
+// Auto-conecta ao carregar
+window.addEventListener('load', connect);
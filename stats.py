@@ -0,0 +1,210 @@
+"""
+Elite Dangerous SSE - Estatísticas ao vivo
+Taxas em janelas deslizantes calculadas incrementalmente a partir dos eventos
+"""
+
+import time
+from collections import Counter
+from typing import Optional, Dict, Any
+
+# Baldes por janela: a memória de cada janela é fixa, a precisão é window/BUCKETS
+WINDOW_BUCKETS = 60
+
+# Eventos de venda de dados de exploração
+EXPLORATION_EVENTS = {"SellExplorationData", "MultiSellExplorationData"}
+
+
+class SlidingWindow:
+    """Soma em uma janela deslizante usando um anel de baldes de tempo"""
+
+    def __init__(self, window: float, buckets: int = WINDOW_BUCKETS):
+        self.window = window
+        self.bucket_width = window / buckets
+        self.values = [0.0] * buckets
+        # Índice absoluto do balde guardado em cada posição do anel
+        self.slots = [-1] * buckets
+
+    def _slot(self, now: float) -> int:
+        bucket = int(now // self.bucket_width)
+        position = bucket % len(self.values)
+        if self.slots[position] != bucket:
+            # Balde reaproveitado: o valor antigo já saiu da janela
+            self.slots[position] = bucket
+            self.values[position] = 0.0
+        return position
+
+    def add(self, value: float = 1.0, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self.values[self._slot(now)] += value
+
+    def total(self, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        current = int(now // self.bucket_width)
+        oldest = current - len(self.values)
+        return sum(value for value, bucket in zip(self.values, self.slots) if oldest < bucket <= current)
+
+    def state(self) -> Dict[str, Any]:
+        # Índices de balde são absolutos, então continuam válidos após reiniciar
+        return {"values": list(self.values), "slots": list(self.slots)}
+
+    def load_state(self, state: Dict[str, Any]):
+        if len(state["values"]) == len(self.values):
+            self.values = list(state["values"])
+            self.slots = list(state["slots"])
+
+
+class SlidingCounter:
+    """Contagem por chave em uma janela deslizante (ex.: eventos por tipo)"""
+
+    def __init__(self, window: float, buckets: int = WINDOW_BUCKETS):
+        self.window = window
+        self.bucket_width = window / buckets
+        self.counters = [Counter() for _ in range(buckets)]
+        self.slots = [-1] * buckets
+
+    def add(self, key: str, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        bucket = int(now // self.bucket_width)
+        position = bucket % len(self.counters)
+        if self.slots[position] != bucket:
+            self.slots[position] = bucket
+            self.counters[position].clear()
+        self.counters[position][key] += 1
+
+    def totals(self, now: Optional[float] = None) -> Counter:
+        now = time.time() if now is None else now
+        current = int(now // self.bucket_width)
+        oldest = current - len(self.counters)
+        result = Counter()
+        for counter, bucket in zip(self.counters, self.slots):
+            if oldest < bucket <= current:
+                result.update(counter)
+        return result
+
+    def state(self) -> Dict[str, Any]:
+        return {"counters": [dict(counter) for counter in self.counters], "slots": list(self.slots)}
+
+    def load_state(self, state: Dict[str, Any]):
+        if len(state["counters"]) == len(self.counters):
+            self.counters = [Counter(counter) for counter in state["counters"]]
+            self.slots = list(state["slots"])
+
+
+class LiveStats:
+    """Agregados de um comandante (ou de todos) desde o início do servidor"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.jumps = SlidingWindow(3600)
+        self.bounties = SlidingWindow(600)
+        self.exploration = SlidingWindow(3600)
+        self.events_by_type = SlidingCounter(60)
+        self.total_events = 0
+        self.total_jumps = 0
+        self.total_distance = 0.0
+        self.total_bounties = 0.0
+        self.total_exploration = 0.0
+
+    def record(self, event_data: Dict[str, Any], now: float):
+        event_name = event_data.get("event", "unknown")
+        self.total_events += 1
+        self.events_by_type.add(event_name, now)
+
+        if event_name == "FSDJump":
+            self.jumps.add(1, now)
+            self.total_jumps += 1
+            self.total_distance += event_data.get("JumpDist", 0.0)
+        elif event_name == "Bounty":
+            # Eventos antigos usam Reward em vez de TotalReward
+            reward = event_data.get("TotalReward", event_data.get("Reward", 0))
+            self.bounties.add(reward, now)
+            self.total_bounties += reward
+        elif event_name in EXPLORATION_EVENTS:
+            value = event_data.get("TotalEarnings", 0)
+            self.exploration.add(value, now)
+            self.total_exploration += value
+
+    def state(self) -> Dict[str, Any]:
+        # started fica de fora: uptime_seconds conta a partir deste processo
+        return {
+            "jumps": self.jumps.state(),
+            "bounties": self.bounties.state(),
+            "exploration": self.exploration.state(),
+            "events_by_type": self.events_by_type.state(),
+            "totals": [
+                self.total_events, self.total_jumps, self.total_distance,
+                self.total_bounties, self.total_exploration,
+            ],
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        self.jumps.load_state(state["jumps"])
+        self.bounties.load_state(state["bounties"])
+        self.exploration.load_state(state["exploration"])
+        self.events_by_type.load_state(state["events_by_type"])
+        (
+            self.total_events, self.total_jumps, self.total_distance,
+            self.total_bounties, self.total_exploration,
+        ) = state["totals"]
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": round(now - self.started),
+            "jumps_last_hour": int(self.jumps.total(now)),
+            "bounty_credits_last_10min": int(self.bounties.total(now)),
+            "exploration_credits_last_hour": int(self.exploration.total(now)),
+            "events_last_minute": dict(self.events_by_type.totals(now).most_common()),
+            "totals": {
+                "events": self.total_events,
+                "jumps": self.total_jumps,
+                "jump_distance_ly": round(self.total_distance, 2),
+                "bounty_credits": int(self.total_bounties),
+                "exploration_credits": int(self.total_exploration),
+            },
+        }
+
+
+class StatsEngine:
+    """Alimentado pelo pipeline; mantém agregados gerais e por comandante"""
+
+    def __init__(self):
+        self.overall = LiveStats()
+        self.by_commander: Dict[str, LiveStats] = {}
+
+    def record(self, event_data: Dict[str, Any]):
+        """Listener do pipeline (evento bruto, antes da remoção de dados): custo constante por evento"""
+        now = time.time()
+        self.overall.record(event_data, now)
+        commander = event_data.get("_commander")
+        if commander:
+            stats = self.by_commander.get(commander)
+            if stats is None:
+                stats = self.by_commander[commander] = LiveStats()
+            stats.record(event_data, now)
+
+    def state(self) -> Dict[str, Any]:
+        """Estado completo para o snapshot de reinício"""
+        return {
+            "overall": self.overall.state(),
+            "by_commander": {name: stats.state() for name, stats in self.by_commander.items()},
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        self.overall.load_state(state["overall"])
+        for name, commander_state in state["by_commander"].items():
+            stats = self.by_commander[name] = LiveStats()
+            stats.load_state(commander_state)
+
+    def snapshot(self, commander: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Agregados atuais; None se o comandante não for conhecido"""
+        now = time.time()
+        if commander is None:
+            snapshot = self.overall.snapshot(now)
+            snapshot["commanders"] = sorted(self.by_commander)
+            return snapshot
+        for name, stats in self.by_commander.items():
+            if name.casefold() == commander.casefold():
+                snapshot = stats.snapshot(now)
+                snapshot["commander"] = name
+                return snapshot
+        return None